@@ -0,0 +1,8 @@
+"""
+Fichier __init__.py pour le module api.
+Service JSON en lecture seule sur la base des mesures.
+"""
+
+from .server import QueryService
+
+__all__ = ['QueryService']
@@ -0,0 +1,163 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine
+from database.config import Base, to_sql_datetime
+from database import models  # noqa: F401  (enregistre les tables dans Base.metadata)
+from api.server import QueryService
+
+PARAMETERS = ['pm25', 'pm10', 'no2', 'o3', 'so2', 'co']
+
+def build_synthetic_db(path, cities=50, days=30):
+    # Base de test : `cities` villes, `days` jours de mesures horaires pour 6 polluants
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO locations (id, city, country, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+        [(i + 1, f'City{i}', 'FR', 45.0 + i / 10, 2.0 + i / 10) for i in range(cities)]
+    )
+
+    start = datetime(2025, 1, 1)
+    dates = [to_sql_datetime(start + timedelta(hours=h)) for h in range(days * 24)]
+    rng = np.random.default_rng(0)
+    for loc_id in range(1, cities + 1):
+        values = rng.gamma(2.0, 10.0, size=(len(PARAMETERS), len(dates))).round(1)
+        conn.executemany(
+            "INSERT INTO measurements (location_id, parameter, value, unit, measurement_date) VALUES (?, ?, ?, ?, ?)",
+            [
+                (loc_id, parameter, float(values[p, h]), 'µg/m³', date)
+                for p, parameter in enumerate(PARAMETERS)
+                for h, date in enumerate(dates)
+            ]
+        )
+    conn.execute("INSERT INTO data_version (id, version) VALUES (1, 1)")
+    conn.commit()
+    conn.close()
+    return dates[0][:10], dates[-1][:10]
+
+def random_target(cities, first_day, last_day):
+    # Mélange des trois routes avec des paramètres aléatoires
+    city = f'City{random.randrange(cities)}'
+    parameter = random.choice(PARAMETERS)
+    kind = random.random()
+    if kind < 0.4:
+        return f'/latest?city={city}'
+    if kind < 0.8:
+        return f'/series?city={city}&parameter={parameter}&start={first_day}&end={last_day}'
+    return f'/aggregates?parameter={parameter}'
+
+async def client(host, port, targets, latencies, etags):
+    # Un client = une connexion keep-alive qui enchaîne ses requêtes
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for target in targets:
+            request = f"GET {target} HTTP/1.1\r\nHost: {host}\r\n"
+            if target in etags:
+                request += f"If-None-Match: {etags[target]}\r\n"
+            started = time.perf_counter()
+            writer.write((request + "\r\n").encode())
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'etag':
+                    etags[target] = value.strip()
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+
+            if not status_line.startswith((b'HTTP/1.1 200', b'HTTP/1.1 304')):
+                raise RuntimeError(f"{target}: {status_line.decode().strip()}")
+    finally:
+        writer.close()
+
+async def run_clients(host, port, concurrency, requests, cities, first_day, last_day, use_etags):
+    latencies = []
+    per_client = requests // concurrency
+    tasks = []
+    for _ in range(concurrency):
+        targets = [random_target(cities, first_day, last_day) for _ in range(per_client)]
+        etags = {} if use_etags else _NoStore()
+        tasks.append(client(host, port, targets, latencies, etags))
+
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started
+
+class _NoStore(dict):
+    # Sans ETag : le client ne mémorise rien
+    def __setitem__(self, key, value):
+        pass
+
+def start_service_thread(service, host):
+    # Le service tourne dans sa propre boucle pour ne pas partager le CPU de boucle avec les clients
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    result = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        result['port'] = loop.run_until_complete(service.start(host, 0))
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    return loop, result['port']
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du service de requetes sur une base synthetique")
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--cache-size', type=int, default=256, help="0 pour mesurer sans cache")
+    parser.add_argument('--etags', action='store_true', help="les clients renvoient If-None-Match")
+    args = parser.parse_args()
+
+    host = '127.0.0.1'
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'loadtest.db')
+        print(f"Creation de la base synthetique ({args.cities} villes, {args.days} jours)...")
+        first_day, last_day = build_synthetic_db(db_path, args.cities, args.days)
+
+        service = QueryService(db_path, cache_size=args.cache_size)
+        loop, port = start_service_thread(service, host)
+
+        try:
+            latencies, elapsed = asyncio.run(run_clients(
+                host, port, args.concurrency, args.requests, args.cities, first_day, last_day, args.etags
+            ))
+        finally:
+            asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"Requetes      : {len(latencies)} ({args.concurrency} clients)")
+    print(f"Debit         : {len(latencies) / elapsed:.0f} req/s")
+    print(f"Latence p50   : {np.percentile(latencies_ms, 50):.2f} ms")
+    print(f"Latence p99   : {np.percentile(latencies_ms, 99):.2f} ms")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,392 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from database.config import get_db_path, to_sql_datetime
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Valeurs par défaut du service
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+POOL_SIZE = 4           # Connexions SQLite en lecture seule
+CACHE_SIZE = 256        # Réponses gardées en mémoire
+POLL_INTERVAL = 1.0     # Vérification de la version des données (secondes)
+
+LATEST_QUERY = """
+SELECT l.city, l.country, m.parameter, m.value, m.unit, m.measurement_date
+FROM measurements m
+JOIN locations l ON m.location_id = l.id
+JOIN (
+    SELECT location_id, parameter, MAX(measurement_date) AS last_date
+    FROM measurements
+    GROUP BY location_id, parameter
+) latest ON m.location_id = latest.location_id
+        AND m.parameter = latest.parameter
+        AND m.measurement_date = latest.last_date
+WHERE (:city IS NULL OR l.city = :city)
+  AND (:parameter IS NULL OR m.parameter = :parameter)
+ORDER BY l.city, m.parameter
+"""
+
+SERIES_QUERY = """
+SELECT m.measurement_date, m.value
+FROM measurements m
+JOIN locations l ON m.location_id = l.id
+WHERE l.city = :city
+  AND m.parameter = :parameter
+  AND (:start IS NULL OR m.measurement_date >= :start)
+  AND (:end IS NULL OR m.measurement_date < :end)
+ORDER BY m.measurement_date
+"""
+
+# Journées plus anciennes que la rétention : seuls leurs agrégats journaliers restent
+# Une journée est incluse dès qu'elle commence dans la période ou contient son début
+DAILY_SERIES_QUERY = """
+SELECT d.day, d.mean_value, d.min_value, d.max_value, d.count
+FROM measurements_daily d
+JOIN locations l ON d.location_id = l.id
+WHERE l.city = :city
+  AND d.parameter = :parameter
+  AND (:start_day IS NULL OR d.day >= :start_day)
+  AND (:end IS NULL OR d.day < :end)
+ORDER BY d.day
+"""
+
+# Mesures horaires et agrégats journaliers réunis (moyenne pondérée par le nombre de mesures)
+AGGREGATES_QUERY = """
+SELECT l.city, l.country, s.unit,
+       SUM(s.total) / SUM(s.count) AS mean, MIN(s.min) AS min, MAX(s.max) AS max, SUM(s.count) AS count
+FROM (
+    SELECT location_id, unit, SUM(value) AS total, MIN(value) AS min, MAX(value) AS max, COUNT(*) AS count
+    FROM measurements
+    WHERE parameter = :parameter
+      AND (:start IS NULL OR measurement_date >= :start)
+      AND (:end IS NULL OR measurement_date < :end)
+    GROUP BY location_id, unit
+    UNION ALL
+    SELECT location_id, unit, SUM(mean_value * count), MIN(min_value), MAX(max_value), SUM(count)
+    FROM measurements_daily
+    WHERE parameter = :parameter
+      AND (:start_day IS NULL OR day >= :start_day)
+      AND (:end IS NULL OR day < :end)
+    GROUP BY location_id, unit
+) s
+JOIN locations l ON s.location_id = l.id
+GROUP BY l.city, l.country, s.unit
+ORDER BY mean DESC
+"""
+
+VERSION_QUERY = "SELECT version FROM data_version WHERE id = 1"
+
+STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+class BadRequest(Exception):
+    pass
+
+def _parse_date(params, name):
+    # Date ISO 8601 du paramètre name (None si absent)
+    # Les dates sont comparées en texte en base : '2025-01' ou '01/02/2025' seraient mal classées
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"parametre '{name}' : date ISO 8601 attendue (ex. 2025-01-31 ou 2025-01-31T12:00)")
+    if date.tzinfo is not None:
+        raise BadRequest(f"parametre '{name}' : date sans fuseau horaire attendue (heure locale des mesures)")
+    return date
+
+class ReadOnlyPool:
+    """Petit pool de connexions SQLite ouvertes en lecture seule."""
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            # mode=ro : le service ne peut pas écrire ni verrouiller la base en écriture
+            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self.connections.put(conn)
+
+    def query(self, sql, params=None):
+        conn = self.connections.get()
+        try:
+            return [dict(row) for row in conn.execute(sql, params or {})]
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+class ResponseCache:
+    """Cache LRU des réponses JSON, vidé quand la version des données change."""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class QueryService:
+    """Service HTTP JSON en lecture seule sur la base des mesures."""
+
+    def __init__(self, db_path=None, pool_size=POOL_SIZE, cache_size=CACHE_SIZE, poll_interval=POLL_INTERVAL):
+        self.db_path = db_path or get_db_path()
+        self.pool = ReadOnlyPool(self.db_path, pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        self.cache = ResponseCache(cache_size)
+        self.pending = {}  # Requêtes en cours de calcul, par clé de cache
+        self.poll_interval = poll_interval
+        self.version = self._read_version()
+        self.server = None
+        self._poll_task = None
+
+        self.routes = {
+            '/latest': self._latest,
+            '/series': self._series,
+            '/aggregates': self._aggregates,
+        }
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self._handle_client, host, port)
+        self._poll_task = asyncio.create_task(self._poll_version())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        port = await self.start(host, port)
+        logger.info(f"Service de requetes sur http://{host}:{port} (base : {self.db_path})")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self._poll_task:
+            self._poll_task.cancel()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+    def _read_version(self):
+        try:
+            rows = self.pool.query(VERSION_QUERY)
+            return rows[0]['version'] if rows else 0
+        except sqlite3.OperationalError:
+            # Table absente (ancienne base)
+            return 0
+
+    async def _poll_version(self):
+        # Un chargement incrémente data_version : on vide alors le cache
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                version = await loop.run_in_executor(self.executor, self._read_version)
+            except Exception as e:
+                logger.error(f"Lecture de la version impossible: {e}")
+                continue
+            if version != self.version:
+                logger.info(f"Nouvelle version des donnees ({self.version} -> {version}) : cache vide")
+                self.version = version
+                self.cache.clear()
+
+    # --- Requêtes ---
+
+    def _latest(self, params):
+        return self.pool.query(LATEST_QUERY, {
+            'city': params.get('city'),
+            'parameter': params.get('parameter'),
+        })
+
+    def _series(self, params):
+        # Mesures horaires, et agrégats journaliers pour les journées déjà passées
+        # par la rétention (leurs mesures horaires ont été supprimées)
+        if not params.get('city') or not params.get('parameter'):
+            raise BadRequest("parametres 'city' et 'parameter' obligatoires")
+        query_params = self._range_params(params)
+        query_params.update(city=params['city'], parameter=params['parameter'])
+
+        rows = self.pool.query(SERIES_QUERY, query_params)
+        daily = self.pool.query(DAILY_SERIES_QUERY, query_params)
+        return {
+            'city': params['city'],
+            'parameter': params['parameter'],
+            'dates': [row['measurement_date'] for row in rows],
+            'values': [row['value'] for row in rows],
+            'daily': {
+                'days': [row['day'] for row in daily],
+                'mean': [row['mean_value'] for row in daily],
+                'min': [row['min_value'] for row in daily],
+                'max': [row['max_value'] for row in daily],
+                'count': [row['count'] for row in daily],
+            },
+        }
+
+    def _aggregates(self, params):
+        if not params.get('parameter'):
+            raise BadRequest("parametre 'parameter' obligatoire")
+        query_params = self._range_params(params)
+        query_params['parameter'] = params['parameter']
+        return self.pool.query(AGGREGATES_QUERY, query_params)
+
+    def _range_params(self, params):
+        start = _parse_date(params, 'start')
+        return {
+            'start': to_sql_datetime(start),
+            # Les agrégats journaliers sont datés de minuit
+            'start_day': to_sql_datetime(start.replace(hour=0, minute=0, second=0, microsecond=0)) if start else None,
+            'end': to_sql_datetime(_parse_date(params, 'end')),
+        }
+
+    async def _respond(self, path, params):
+        # Réponse (etag, corps) pour une route, depuis le cache si possible
+        handler = self.routes.get(path)
+        if handler is None:
+            return 404, None, json.dumps({'error': 'route inconnue'}).encode()
+
+        key = (path, tuple(sorted(params.items())))
+        entry = self.cache.get(key)
+        if entry is not None:
+            return 200, entry[0], entry[1]
+
+        # Même requête déjà en cours (cache froid) : on attend son résultat
+        # plutôt que de relancer la requête SQL
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._compute(key, handler, params))
+            self.pending[key] = pending
+            pending.add_done_callback(lambda _: self.pending.pop(key, None))
+
+        try:
+            etag, body = await asyncio.shield(pending)
+        except BadRequest as e:
+            return 400, None, json.dumps({'error': str(e)}).encode()
+        return 200, etag, body
+
+    async def _compute(self, key, handler, params):
+        version = self.version
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, handler, params)
+
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+
+        # Ne pas mettre en cache une réponse calculée pendant un changement de version
+        if version == self.version:
+            self.cache.put(key, (etag, body))
+        return etag, body
+
+    # --- HTTP ---
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._write(writer, 400, None, json.dumps({'error': 'requete invalide'}).encode(), False)
+                    break
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                if method != 'GET':
+                    status, etag, body = 405, None, json.dumps({'error': 'GET uniquement'}).encode()
+                else:
+                    url = urlsplit(target)
+                    params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                    try:
+                        status, etag, body = await self._respond(url.path, params)
+                    except Exception as e:
+                        logger.error(f"Erreur sur {target}: {e}")
+                        status, etag, body = 500, None, json.dumps({'error': 'erreur interne'}).encode()
+
+                # Le client a déjà cette version de la réponse
+                if status == 200 and etag and headers.get('if-none-match') == etag:
+                    status, body = 304, b''
+
+                await self._write(writer, status, etag, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write(self, writer, status, etag, body, keep_alive):
+        head = [
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            "Cache-Control: no-cache",
+        ]
+        if status != 304:
+            head.append("Content-Type: application/json; charset=utf-8")
+        if etag:
+            head.append(f"ETag: {etag}")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="Service JSON en lecture seule sur les mesures")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db', default=None, help="chemin de la base (par defaut data/air_quality.db)")
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    args = parser.parse_args()
+
+    service = QueryService(args.db, pool_size=args.pool_size, cache_size=args.cache_size)
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -9,8 +9,14 @@ from sqlalchemy import text
 
 # Ajout du chemin racine pour les imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database.config import get_engine, init_db
+from database.config import get_engine, init_db, SQLITE_DATETIME_FORMAT
+from database.models import AQI_PARAMETER
 from database.load_demo import load_demo_data
+from database.version import get_data_version
+from dashboard.frame_cache import MeasurementFrame
+from dashboard.store import TimeSeriesStore
+from src.aqi import AirQualityIndexCalculator, LEVELS
+from src.analytics import CorrelationAnalyzer
 
 # Initialiser automatiquement la base de données au premier lancement
 init_db()
@@ -23,6 +29,7 @@ try:
         count = result.fetchone()[0]
         if count == 0:
             load_demo_data()
+            AirQualityIndexCalculator().rebuild()
 except:
     pass  # Ignorer les erreurs silencieusement
 
@@ -33,47 +40,84 @@ st.set_page_config(
     layout="wide"
 )
 
-# Fonction de chargement des données (mise en cache)
-@st.cache_data(ttl=300)  # Cache pour 5 minutes
-def load_data():
+# Frame des mesures partagé par toutes les sessions du serveur
+@st.cache_resource
+def get_measurement_frame():
+    """Crée le cache incrémental des mesures (une seule instance par serveur)"""
+    return MeasurementFrame(get_engine())
+
+# Fonction de chargement des données
+# Le frame n'est complété que lorsque la version des données change, et seules
+# les lignes ajoutées depuis le dernier chargement sont lues dans la base
+def load_data(data_version):
     """Charge les données depuis la base SQLite"""
+    try:
+        return get_measurement_frame().refresh(data_version)
+    except Exception as e:
+        st.error(f"Erreur de connexion à la base de données: {e}")
+        return pd.DataFrame()
+
+# Séries triées par (ville, polluant), reconstruites une fois par version des données
+# et partagées par toutes les sessions : les filtres n'ont plus à parcourir le frame
+@st.cache_resource(max_entries=2)
+def get_store(data_version):
+    """Construit le store des séries temporelles"""
+    return TimeSeriesStore(load_data(data_version))
+
+# Corrélations entre villes : le cache interne est indexé sur la version des données
+# et la période, partagé par toutes les sessions
+@st.cache_resource
+def get_correlation_analyzer():
+    """Crée l'analyseur de corrélations (une seule instance par serveur)"""
+    return CorrelationAnalyzer()
+
+# Coordonnées des villes : stockées une seule fois, jointes pour la carte
+@st.cache_data(max_entries=2)
+def load_locations(data_version):
+    """Charge les villes et leurs coordonnées"""
+    engine = get_engine()
+    with engine.connect() as conn:
+        return pd.read_sql("SELECT city, country, latitude, longitude FROM locations", conn)
+
+# Dernier indice européen calculé pour chaque ville
+@st.cache_data(max_entries=2)
+def load_latest_aqi(data_version):
+    """Charge la dernière valeur de l'indice européen par ville"""
     engine = get_engine()
     
     query = """
-    SELECT 
-        l.city, 
-        l.country, 
-        l.latitude, 
-        l.longitude,
-        m.parameter, 
-        m.value, 
-        m.unit, 
-        m.measurement_date
-    FROM measurements m
-    JOIN locations l ON m.location_id = l.id
-    ORDER BY m.measurement_date DESC
+    SELECT l.city, l.country, a.measurement_date, a.aqi, a.level, a.dominant
+    FROM aqi a
+    JOIN locations l ON a.location_id = l.id
+    JOIN (
+        SELECT location_id, MAX(measurement_date) AS last_date
+        FROM aqi
+        GROUP BY location_id
+    ) latest ON a.location_id = latest.location_id AND a.measurement_date = latest.last_date
     """
     
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
-            # Conversion explicite des dates
-            df['measurement_date'] = pd.to_datetime(df['measurement_date'])
-            return df
-    except Exception as e:
-        st.error(f"Erreur de connexion à la base de données: {e}")
-        return pd.DataFrame()
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn)
+    df['level_name'] = [LEVELS[level - 1] for level in df['level']]
+    return df
 
-@st.cache_data(ttl=300)
-def get_statistics():
+@st.cache_data(max_entries=2)
+def get_statistics(data_version):
     """Récupère les statistiques générales."""
     engine = get_engine()
     
     with engine.connect() as conn:
-        # Nombre total de mesures
+        # Nombre total de mesures, y compris celles agrégées par jour par la rétention
         result = conn.execute(text("SELECT COUNT(*) FROM measurements"))
         total_measurements = result.fetchone()[0]
         
+        result = conn.execute(
+            text("SELECT COALESCE(SUM(count), 0) FROM measurements_daily WHERE parameter != :aqi"),
+            {'aqi': AQI_PARAMETER}
+        )
+        aggregated_measurements = result.fetchone()[0]
+        total_measurements += aggregated_measurements
+        
         # Nombre de villes
         result = conn.execute(text("SELECT COUNT(DISTINCT city) FROM locations"))
         total_cities = result.fetchone()[0]
@@ -89,7 +133,7 @@ def get_statistics():
         # Conversion string -> datetime si nécessaire (SQLite stocke les dates en string)
         if isinstance(last_update, str):
             try:
-                last_update = datetime.strptime(last_update, "%Y-%m-%d %H:%M:%S.%f")
+                last_update = datetime.strptime(last_update, SQLITE_DATETIME_FORMAT)
             except ValueError:
                 try:
                     last_update = datetime.strptime(last_update, "%Y-%m-%d %H:%M:%S")
@@ -98,6 +142,7 @@ def get_statistics():
     
     return {
         'total_measurements': total_measurements,
+        'aggregated_measurements': aggregated_measurements,
         'total_cities': total_cities,
         'total_countries': total_countries,
         'last_update': last_update
@@ -113,8 +158,9 @@ def main():
     try:
         # Chargement des données
         with st.spinner('Chargement des données...'):
-            df = load_data()
-            stats = get_statistics()
+            data_version = get_data_version()
+            df = load_data(data_version)
+            stats = get_statistics(data_version)
         
         if df.empty:
             st.warning("⚠️ Aucune donnée disponible. Veuillez exécuter le pipeline ETL d'abord.")
@@ -125,7 +171,11 @@ def main():
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Mesures", f"{stats['total_measurements']:,}")
+            st.metric(
+                "Total Mesures",
+                f"{stats['total_measurements']:,}",
+                help=f"dont {stats['aggregated_measurements']:,} anciennes mesures agrégées par jour"
+            )
         
         with col2:
             st.metric("Villes", stats['total_cities'])
@@ -142,8 +192,10 @@ def main():
         # Filtres
         st.sidebar.header("Filtres")
         
+        store = get_store(data_version)
+        
         # Filtre par pays
-        countries = sorted(df['country'].unique())
+        countries = store.country_list()
         selected_countries = st.sidebar.multiselect(
             "Pays",
             options=countries,
@@ -151,48 +203,57 @@ def main():
         )
         
         # Filtre par paramètre
-        parameters = sorted(df['parameter'].unique())
+        parameters = store.parameters()
         selected_param = st.sidebar.selectbox(
             "Polluant",
             options=parameters,
             index=0
         )
         
-        # Filtrer les données par pays et paramètre
-        filtered_df = df[
-            (df['country'].isin(selected_countries)) &
-            (df['parameter'] == selected_param)
-        ]
+        # Filtre par ville (dynamique) : villes des pays choisis mesurant ce polluant
+        available_cities = store.cities(selected_countries, selected_param)
         
-        if filtered_df.empty:
+        if not available_cities:
             st.warning("Aucune donnée pour les filtres sélectionnés.")
             return
-
-        # Filtre par ville (dynamique)
-        available_cities = sorted(filtered_df['city'].unique())
+        
         selected_cities = st.sidebar.multiselect(
             "Villes",
             options=available_cities,
             default=available_cities  # Toutes les villes par défaut
         )
         
-        # Appliquer le filtre ville
-        final_df = filtered_df[filtered_df['city'].isin(selected_cities)]
-        
-        if final_df.empty:
+        # Filtre par période
+        first_date, last_date = store.time_bounds()
+        start_date, end_date = st.sidebar.slider(
+            "Période",
+            min_value=first_date.to_pydatetime(),
+            max_value=last_date.to_pydatetime(),
+            value=(first_date.to_pydatetime(), last_date.to_pydatetime()),
+            step=timedelta(hours=1),
+            format="DD/MM HH:mm"
+        ) if first_date < last_date else (first_date, last_date)
+        
+        # Statistiques par ville sur la période (recherche dichotomique + sommes cumulées)
+        city_stats = store.summary(selected_cities, selected_param, start_date, end_date)
+        
+        if city_stats.empty:
             st.warning("Veuillez sélectionner au moins une ville.")
             return
         
+        unit = store.units.get(selected_param, '')
+        
         # GRAPHIQUE 1: Évolution temporelle
         st.subheader(f"📈 Évolution de {selected_param.upper()} dans le temps")
         
         fig_time = px.line(
-            final_df,
+            store.frame(selected_cities, selected_param, start_date, end_date),
             x='measurement_date',
             y='value',
             color='city',
+            hover_data={'value': ':.2f'},
             title=f"Concentration de {selected_param.upper()} par ville",
-            labels={'value': f'{selected_param.upper()} ({final_df["unit"].iloc[0]})', 
+            labels={'value': f'{selected_param.upper()} ({unit})', 
                     'measurement_date': 'Date',
                     'city': 'Ville'}
         )
@@ -202,13 +263,13 @@ def main():
         # GRAPHIQUE 2: Comparaison par ville
         st.subheader(f"🏙️ Comparaison par ville - {selected_param.upper()}")
         
-        city_avg = final_df.groupby('city')['value'].mean().sort_values(ascending=False)
+        city_avg = city_stats.set_index('city')['mean'].round(2).sort_values(ascending=False)
         
         fig_bar = px.bar(
             x=city_avg.index,
             y=city_avg.values,
             title=f"Moyenne de {selected_param.upper()} par ville",
-            labels={'x': 'Ville', 'y': f'{selected_param.upper()} moyen ({final_df["unit"].iloc[0]})'},
+            labels={'x': 'Ville', 'y': f'{selected_param.upper()} moyen ({unit})'},
             color=city_avg.values,
             color_continuous_scale='RdYlGn_r'
         )
@@ -218,10 +279,10 @@ def main():
         # GRAPHIQUE 3: Carte géographique
         st.subheader(f"🗺️ Carte de la pollution - {selected_param.upper()}")
         
-        # Données agrégées par ville (sur final_df pour être cohérent)
-        map_data = final_df.groupby(['city', 'country', 'latitude', 'longitude']).agg({
-            'value': 'mean'
-        }).reset_index()
+        # Moyennes par ville (les mêmes que le graphique précédent)
+        map_data = city_stats[['city', 'country', 'mean']].rename(columns={'mean': 'value'}).merge(
+            load_locations(data_version), on=['city', 'country']
+        )
         
         map_data = map_data.dropna(subset=['latitude', 'longitude'])
         
@@ -246,13 +307,86 @@ def main():
             fig_map.update_layout(height=750)  # Carte plus grande
             st.plotly_chart(fig_map, width='stretch')
         
+        # GRAPHIQUE 4: Indice européen de qualité de l'air
+        st.subheader("🌡️ Indice européen de qualité de l'air")
+        
+        aqi_df = load_latest_aqi(data_version)
+        aqi_df = aqi_df[aqi_df['city'].isin(selected_cities)].sort_values('aqi', ascending=False)
+        
+        if aqi_df.empty:
+            st.info("Indice non calculé. Lancez `python src/aqi.py` pour le calculer sur l'historique.")
+        else:
+            fig_aqi = px.bar(
+                aqi_df,
+                x='city',
+                y='aqi',
+                color='level_name',
+                category_orders={'level_name': LEVELS},
+                color_discrete_sequence=['#50f0e6', '#50ccaa', '#f0e641', '#ff5050', '#960032', '#7d2181'],
+                hover_data={'dominant': True, 'measurement_date': True},
+                title="Dernier indice par ville (max des sous-indices PM2.5, PM10, NO₂, O₃, SO₂)",
+                labels={'city': 'Ville', 'aqi': 'Indice', 'level_name': 'Niveau',
+                        'dominant': 'Polluant dominant', 'measurement_date': 'Heure'}
+            )
+            fig_aqi.update_layout(height=400)
+            st.plotly_chart(fig_aqi, width='stretch')
+        
+        # GRAPHIQUE 5: Corrélations entre villes
+        st.subheader(f"🔗 Corrélations entre villes - {selected_param.upper()}")
+        
+        correlations = get_correlation_analyzer().analyze(selected_param, start_date, end_date)
+        corr_cities = [city for city in correlations['cities'] if city in selected_cities]
+        corr = correlations['correlation'].loc[corr_cities, corr_cities] if corr_cities else pd.DataFrame()
+        
+        if len(corr_cities) < 2 or corr.isna().all().all():
+            st.info("Pas assez d'heures communes entre les villes sélectionnées pour calculer des corrélations.")
+        else:
+            col_corr, col_lag = st.columns(2)
+            
+            with col_corr:
+                fig_corr = px.imshow(
+                    corr,
+                    zmin=-1,
+                    zmax=1,
+                    color_continuous_scale='RdBu_r',
+                    text_auto='.2f',
+                    title="Corrélation horaire entre villes",
+                    labels={'color': 'r'}
+                )
+                fig_corr.update_layout(height=500)
+                st.plotly_chart(fig_corr, width='stretch')
+            
+            with col_lag:
+                fig_lag = px.imshow(
+                    correlations['best_lag'].loc[corr_cities, corr_cities],
+                    color_continuous_scale='PuOr',
+                    color_continuous_midpoint=0,
+                    text_auto=True,
+                    title="Décalage (h) : la ville en ligne précède la ville en colonne",
+                    labels={'color': 'heures'}
+                )
+                fig_lag.update_layout(height=500)
+                st.plotly_chart(fig_lag, width='stretch')
+            
+            # Couples où une ville précède nettement l'autre
+            lag = correlations['best_lag'].loc[corr_cities, corr_cities].stack()
+            peak = correlations['peak'].loc[corr_cities, corr_cities].stack()
+            leaders = pd.DataFrame({'Décalage (h)': lag, 'Corrélation': peak.round(2)})
+            leaders = leaders[(leaders['Décalage (h)'] > 0) & (leaders['Corrélation'] >= 0.5)]
+            leaders = leaders.rename_axis(['Ville en avance', 'Ville suivante']).reset_index()
+            
+            if not leaders.empty:
+                st.dataframe(
+                    leaders.sort_values('Corrélation', ascending=False).head(10),
+                    width='stretch',
+                    hide_index=True
+                )
+        
         # Tableau de données
         st.subheader("📊 Données détaillées")
         
         # Top 10 villes les plus polluées
-        top_cities = final_df.groupby('city').agg({
-            'value': ['mean', 'max', 'min', 'count']
-        }).round(2)
+        top_cities = city_stats.set_index('city')[['mean', 'max', 'min', 'count']].round(2)
         top_cities.columns = ['Moyenne', 'Maximum', 'Minimum', 'Nb mesures']
         top_cities = top_cities.sort_values('Moyenne', ascending=False).head(10)
         
@@ -0,0 +1,160 @@
+import threading
+from datetime import timedelta
+import pandas as pd
+from sqlalchemy import text
+from src.retention import raw_history_start
+from src.transform import CATEGORY_COLUMNS, compact_measurements
+
+# Nombre de jours gardés en mémoire (fenêtre visible du dashboard)
+WINDOW_DAYS = 30
+
+# Partition réécrite en entier par le chargement quand une de ses mesures change :
+# les lignes reçues remplacent toutes les lignes en mémoire de la même partition
+PARTITION_COLUMNS = ['city', 'country', 'day']
+
+SELECT_COLUMNS = """
+    SELECT
+        m.id,
+        l.city,
+        l.country,
+        m.parameter,
+        m.value,
+        m.unit,
+        m.measurement_date
+    FROM measurements m
+    JOIN locations l ON m.location_id = l.id
+"""
+
+# Premier chargement : uniquement la fenêtre visible
+INITIAL_QUERY = SELECT_COLUMNS + """
+    WHERE m.measurement_date >= (
+        SELECT datetime(MAX(measurement_date), :window) FROM measurements
+    )
+    ORDER BY m.measurement_date
+"""
+
+# Chargements suivants : uniquement les lignes au-delà du dernier id connu
+# (parcours de la clé primaire, coût proportionnel aux nouvelles lignes)
+# Les id sont AUTOINCREMENT : une partition réécrite reçoit des id nouveaux
+APPEND_QUERY = SELECT_COLUMNS + """
+    WHERE m.id > :last_id
+    ORDER BY m.measurement_date
+"""
+
+MAX_ID_QUERY = "SELECT MAX(id) FROM measurements"
+
+class MeasurementFrame:
+    """DataFrame des mesures gardé en mémoire et complété au fil des chargements."""
+
+    def __init__(self, engine, window_days=WINDOW_DAYS):
+        self.engine = engine
+        self.window = timedelta(days=window_days)
+        self.df = pd.DataFrame()
+        self.last_id = 0       # Plus grand id de mesure déjà chargé
+        self.version = None    # Version des données correspondant à self.df
+
+        # Streamlit sert plusieurs sessions dans des threads différents
+        self._lock = threading.Lock()
+
+    def refresh(self, data_version):
+        # Mettre à jour le frame si la version des données a changé
+        with self._lock:
+            if data_version == self.version:
+                return self.df
+
+            # Base recréée ou migrée : les id repartent plus bas que le dernier
+            # id connu, les lignes en mémoire ne correspondent plus à rien
+            with self.engine.connect() as conn:
+                max_id = conn.exec_driver_sql(MAX_ID_QUERY).scalar() or 0
+            if max_id < self.last_id:
+                self.df = pd.DataFrame()
+                self.last_id = 0
+
+            new_rows = self._fetch_new_rows()
+
+            if not new_rows.empty:
+                self.last_id = int(new_rows['id'].max())
+                self.df = self._append(new_rows.drop(columns=['id']))
+
+            self.df = self._evict_archived(self.df)
+
+            self.version = data_version
+            return self.df
+
+    def _fetch_new_rows(self):
+        if self.last_id == 0:
+            query = text(INITIAL_QUERY)
+            params = {'window': f'-{self.window.days} days'}
+        else:
+            query = text(APPEND_QUERY)
+            params = {'last_id': self.last_id}
+
+        with self.engine.connect() as conn:
+            rows = pd.read_sql(query, conn, params=params)
+
+        # SQLite stocke les dates en texte, avec ou sans microsecondes
+        rows['measurement_date'] = pd.to_datetime(rows['measurement_date'], format='ISO8601')
+        return compact_measurements(rows)
+
+    def _append(self, new_rows):
+        if self.df.empty:
+            combined = new_rows.reset_index(drop=True)
+        else:
+            old = self.df
+            first_new = new_rows['measurement_date'].iloc[0]
+
+            # Retirer les anciennes lignes des partitions (ville, jour) reçues :
+            # seule la partie du frame postérieure au premier jour reçu est concernée
+            start = old['measurement_date'].searchsorted(first_new.normalize())
+            tail = old.iloc[start:]
+            received = pd.MultiIndex.from_frame(self._partitions(new_rows)).unique()
+            replaced = pd.MultiIndex.from_frame(self._partitions(tail)).isin(received)
+            if replaced.any():
+                old = old.drop(index=tail.index[replaced])
+
+            combined = self._concat(old, new_rows)
+
+            # Les nouvelles lignes sont en général plus récentes : on ne trie que
+            # si elles remontent avant la fin du frame (mesures révisées)
+            if not old.empty and first_new < old['measurement_date'].iloc[-1]:
+                combined = combined.sort_values('measurement_date', kind='stable', ignore_index=True)
+
+        # Evincer les lignes sorties de la fenêtre visible
+        cutoff = combined['measurement_date'].iloc[-1] - self.window
+        start = combined['measurement_date'].searchsorted(cutoff)
+        if start > 0:
+            combined = combined.iloc[start:].reset_index(drop=True)
+
+        return combined
+
+    def _evict_archived(self, df):
+        # La rétention supprime les mesures horaires anciennes sans nouvel id :
+        # on retire du frame les journées qui ne sont plus en base
+        if df.empty:
+            return df
+        start = raw_history_start(self.engine)
+        if start is None or df['measurement_date'].iloc[0] >= start:
+            return df
+        position = df['measurement_date'].searchsorted(start)
+        return df.iloc[position:].reset_index(drop=True)
+
+    def _partitions(self, rows):
+        return pd.DataFrame({
+            'city': rows['city'].astype(str).to_numpy(),
+            'country': rows['country'].astype(str).to_numpy(),
+            'day': rows['measurement_date'].dt.normalize().to_numpy(),
+        }, columns=PARTITION_COLUMNS)
+
+    def _concat(self, old, new):
+        # pd.concat repasse en object si les catégories diffèrent :
+        # on complète d'abord les catégories des deux côtés
+        old = old.copy(deep=False)
+        new = new.copy(deep=False)
+        for col in CATEGORY_COLUMNS:
+            old_cats = old[col].cat.categories
+            new_cats = new[col].cat.categories
+            missing = new_cats.difference(old_cats)
+            if len(missing):
+                old[col] = old[col].cat.add_categories(missing)
+            new[col] = new[col].cat.set_categories(old[col].cat.categories)
+        return pd.concat([old, new], ignore_index=True)
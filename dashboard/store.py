@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+class TimeSeriesStore:
+    """Séries triées par (ville, polluant) pour répondre aux filtres sans parcourir tout le frame."""
+
+    def __init__(self, df):
+        # df : frame compact des mesures (city, country, parameter, unit, value, measurement_date)
+        self.series = {}     # (ville, polluant) -> (dates, valeurs, sommes cumulées)
+        self.countries = {}  # ville -> pays
+        self.units = {}      # polluant -> unité
+
+        if df.empty:
+            return
+
+        city = pd.Categorical(df['city'])
+        parameter = pd.Categorical(df['parameter'])
+        dates = df['measurement_date'].to_numpy('datetime64[ns]')
+        # Valeurs gardées dans le type du frame (float32 pour le frame compact) :
+        # l'arrondi se fait à l'affichage
+        values = df['value'].to_numpy()
+
+        # Un seul tri pour tout le frame : par ville, puis polluant, puis date
+        order = np.lexsort((dates, parameter.codes, city.codes))
+        city_codes = city.codes[order]
+        param_codes = parameter.codes[order]
+        dates = dates[order]
+        values = values[order]
+
+        # Début de chaque série : changement de ville ou de polluant
+        starts = np.flatnonzero(np.diff(city_codes, prepend=-1) | np.diff(param_codes, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+
+        for start, end in zip(starts, ends):
+            key = (city.categories[city_codes[start]], parameter.categories[param_codes[start]])
+            series_values = values[start:end]
+            # Sommes cumulées avec un 0 en tête : somme de [i, j) = prefix[j] - prefix[i]
+            # (cumul en float64 pour ne pas perdre de précision sur les longues séries)
+            prefix = np.concatenate(([0.0], np.cumsum(series_values, dtype='float64')))
+            self.series[key] = (dates[start:end], series_values, prefix)
+
+        self.countries = dict(
+            df[['city', 'country']].drop_duplicates().astype(str).itertuples(index=False, name=None)
+        )
+        self.units = dict(
+            df[['parameter', 'unit']].drop_duplicates('parameter').astype(str).itertuples(index=False, name=None)
+        )
+
+    def parameters(self):
+        return sorted({parameter for _, parameter in self.series})
+
+    def country_list(self):
+        return sorted(set(self.countries.values()))
+
+    def cities(self, countries, parameter):
+        # Villes des pays choisis qui ont des mesures pour ce polluant
+        return sorted(
+            city for city, param in self.series
+            if param == parameter and self.countries.get(city) in countries
+        )
+
+    def time_bounds(self):
+        if not self.series:
+            return None, None
+        first = min(dates[0] for dates, _, _ in self.series.values())
+        last = max(dates[-1] for dates, _, _ in self.series.values())
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+    def _bounds(self, city, parameter, start, end):
+        # Positions [i, j) des mesures entre start et end inclus (recherche dichotomique)
+        dates, _, _ = self.series[(city, parameter)]
+        i = np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        j = np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return i, j
+
+    def slice(self, city, parameter, start, end):
+        if (city, parameter) not in self.series:
+            return np.array([], dtype='datetime64[ns]'), np.array([], dtype='float32')
+        dates, values, _ = self.series[(city, parameter)]
+        i, j = self._bounds(city, parameter, start, end)
+        return dates[i:j], values[i:j]
+
+    def count(self, city, parameter, start, end):
+        if (city, parameter) not in self.series:
+            return 0
+        i, j = self._bounds(city, parameter, start, end)
+        return int(j - i)
+
+    def mean(self, city, parameter, start, end):
+        # Moyenne en O(log n) grâce aux sommes cumulées
+        if (city, parameter) not in self.series:
+            return np.nan
+        _, _, prefix = self.series[(city, parameter)]
+        i, j = self._bounds(city, parameter, start, end)
+        return (prefix[j] - prefix[i]) / (j - i) if j > i else np.nan
+
+    def summary(self, cities, parameter, start, end):
+        # Moyenne, max, min et nombre de mesures par ville sur la période
+        rows = []
+        for city in cities:
+            _, values = self.slice(city, parameter, start, end)
+            if len(values) == 0:
+                continue
+            rows.append({
+                'city': city,
+                'country': self.countries.get(city),
+                'mean': self.mean(city, parameter, start, end),
+                'max': float(values.max()),
+                'min': float(values.min()),
+                'count': len(values)
+            })
+        return pd.DataFrame(rows, columns=['city', 'country', 'mean', 'max', 'min', 'count'])
+
+    def frame(self, cities, parameter, start, end):
+        # Frame long (ville, date, valeur) limité aux mesures affichées
+        parts = []
+        for city in cities:
+            dates, values = self.slice(city, parameter, start, end)
+            if len(values):
+                parts.append(pd.DataFrame({'city': city, 'measurement_date': dates, 'value': values}))
+        if not parts:
+            return pd.DataFrame(columns=['city', 'measurement_date', 'value'])
+        return pd.concat(parts, ignore_index=True)
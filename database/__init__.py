@@ -2,7 +2,10 @@
 Fichier __init__.py pour le module database.
 """
 
-from .config import get_engine, init_db, get_session, Base
-from .models import Location, Measurement
+from .config import get_engine, init_db, get_session, Base, SQLITE_DATETIME_FORMAT, to_sql_datetime
+from .models import Location, Measurement, DataVersion, AirQualityIndex, DailyMeasurement, PartitionChecksum, AQI_PARAMETER
+from .version import get_data_version, bump_data_version
 
-__all__ = ['get_engine', 'init_db', 'get_session', 'Base', 'Location', 'Measurement']
+__all__ = ['get_engine', 'init_db', 'get_session', 'Base', 'SQLITE_DATETIME_FORMAT', 'to_sql_datetime',
+           'Location', 'Measurement', 'DataVersion', 'AirQualityIndex', 'DailyMeasurement', 'PartitionChecksum', 'AQI_PARAMETER',
+           'get_data_version', 'bump_data_version']
@@ -1,10 +1,16 @@
 import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.schema import CreateTable, CreateIndex
 
 # Classe de base pour tous nos modèles de tables
 Base = declarative_base()
 
+# Format des dates stockées en texte par SQLAlchemy dans SQLite
+# Les requêtes SQL brutes comparent les dates en texte : leurs paramètres
+# doivent utiliser exactement ce format
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
 def get_db_path():
     # On stocke la base de données dans un dossier 'data' à la racine du projet
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,6 +21,12 @@ def get_db_path():
     
     return os.path.join(data_dir, 'air_quality.db')
 
+def to_sql_datetime(value):
+    # Date (datetime ou pd.Timestamp) au format de stockage, None si absente
+    if value is None:
+        return None
+    return value.strftime(SQLITE_DATETIME_FORMAT)
+
 def get_engine():
     # Créer le moteur SQLite (pas besoin de serveur, juste un fichier)
     db_path = get_db_path()
@@ -24,18 +36,66 @@ def init_db():
     # Initialiser la base : créer les tables si elles n'existent pas
     engine = get_engine()
     
+    # Réglages SQLite persistants (stockés dans le fichier de la base) :
+    # - auto_vacuum incrémental : doit précéder la création des tables, ne
+    #   s'applique donc qu'aux nouvelles bases
+    # - WAL : les lectures du dashboard ne sont pas bloquées par les écritures
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    
     # On importe les modèles pour que SQLAlchemy les connaisse
-    from database.models import Location, Measurement
+    from database.models import Location, Measurement, DataVersion, AirQualityIndex, DailyMeasurement, PartitionChecksum
     
     # Créer toutes les tables définies dans nos modèles
     # checkfirst=True évite les erreurs si les tables existent déjà
     try:
         Base.metadata.create_all(engine, checkfirst=True)
+        
+        # create_all n'ajoute pas les index aux tables qui existent déjà
+        for index in Measurement.__table__.indexes:
+            index.create(engine, checkfirst=True)
+        
+        _migrate_measurements_autoincrement(engine, Measurement)
         print(f"Base de donnees initialisee : {get_db_path()}")
     except Exception as e:
         # Si erreur (ex: table existe déjà), on ignore silencieusement
         pass
 
+def _migrate_measurements_autoincrement(engine, Measurement):
+    # Les bases créées avant AUTOINCREMENT réutilisent les id supprimés :
+    # SQLite ne sait pas modifier la clé, on reconstruit donc la table (une seule fois)
+    table = Measurement.__table__
+    with engine.connect() as conn:
+        ddl = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'measurements'"
+        ).scalar()
+    if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+        return
+    
+    columns = ', '.join(column.name for column in table.columns)
+    statements = [f"DROP INDEX IF EXISTS {index.name}" for index in table.indexes]
+    statements += [
+        "ALTER TABLE measurements RENAME TO measurements_old",
+        str(CreateTable(table).compile(engine)),
+        *(str(CreateIndex(index).compile(engine)) for index in table.indexes),
+        # Les id existants sont conservés ; sqlite_sequence repart du plus grand
+        f"INSERT INTO measurements ({columns}) SELECT {columns} FROM measurements_old",
+        "DROP TABLE measurements_old",
+    ]
+    
+    # Le module sqlite3 ne place pas le DDL dans une transaction : BEGIN explicite
+    # pour que la reconstruction soit entièrement appliquée ou pas du tout
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.executescript("BEGIN;\n" + ";\n".join(statements) + ";\nCOMMIT;")
+    except Exception:
+        raw.driver_connection.rollback()
+        raise
+    finally:
+        raw.close()
+    print("Table measurements migree vers des id AUTOINCREMENT")
+
 def get_session():
     # Ouvrir une nouvelle connexion à la base
     engine = get_engine()
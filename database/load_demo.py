@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from datetime import datetime
 from database.config import get_session, init_db
 from database.models import Location, Measurement
+from database.version import bump_data_version
 
 def load_demo_data():
     """Charge des données de démonstration si la base est vide"""
@@ -52,6 +53,7 @@ def load_demo_data():
                 )
                 session.add(mes)
         
+        bump_data_version(session)
         session.commit()
         print(f"Donnees de demo chargees : {len(data['locations'])} villes, {len(data['measurements'])} mesures")
         return True
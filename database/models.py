@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .config import Base
@@ -32,5 +32,68 @@ class Measurement(Base):
     measurement_date = Column(DateTime, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Index des lectures par ville, polluant et période (service de requêtes, indice, chargement)
+    # AUTOINCREMENT : une partition réécrite reçoit des id jamais utilisés, le dashboard
+    # retrouve donc les lignes révisées en lisant les id au-delà du dernier connu
+    __table_args__ = (
+        Index('ix_measurements_location_parameter_date', 'location_id', 'parameter', 'measurement_date'),
+        {'sqlite_autoincrement': True},
+    )
+    
     # Relation inverse : chaque mesure appartient à une ville
     location = relationship("Location", back_populates="measurements")
+
+# Compteur de version des données : incrémenté à chaque chargement
+# pour que le dashboard sache quand ses caches sont périmés
+class DataVersion(Base):
+    __tablename__ = 'data_version'
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+# Table de l'indice européen de qualité de l'air (une ligne par ville et par heure)
+class AirQualityIndex(Base):
+    __tablename__ = 'aqi'
+    
+    id = Column(Integer, primary_key=True)
+    location_id = Column(Integer, ForeignKey('locations.id'), nullable=False)
+    measurement_date = Column(DateTime, nullable=False)
+    aqi = Column(Float, nullable=False)          # Indice continu (0-20 bon, ..., >100 extrêmement mauvais)
+    level = Column(Integer, nullable=False)      # Niveau de 1 (bon) à 6 (extrêmement mauvais)
+    dominant = Column(String)                    # Polluant qui détermine l'indice
+    
+    __table_args__ = (UniqueConstraint('location_id', 'measurement_date', name='unique_aqi_location_date'),)
+
+# Paramètre sous lequel l'indice horaire (table aqi) est agrégé dans measurements_daily
+AQI_PARAMETER = 'aqi'
+
+# Agrégats journaliers des mesures anciennes (après suppression des mesures horaires)
+class DailyMeasurement(Base):
+    __tablename__ = 'measurements_daily'
+    
+    id = Column(Integer, primary_key=True)
+    location_id = Column(Integer, ForeignKey('locations.id'), nullable=False)
+    parameter = Column(String, nullable=False)
+    unit = Column(String)
+    day = Column(DateTime, nullable=False)
+    mean_value = Column(Float, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)  # Nombre de mesures horaires agrégées
+    
+    __table_args__ = (UniqueConstraint('location_id', 'parameter', 'day', name='unique_daily_location_parameter_day'),)
+
+# Empreinte du contenu d'une partition (ville, jour) de la table measurements
+# Permet de ne réécrire que les journées dont les valeurs ont été révisées
+class PartitionChecksum(Base):
+    __tablename__ = 'partition_checksums'
+    
+    id = Column(Integer, primary_key=True)
+    location_id = Column(Integer, ForeignKey('locations.id'), nullable=False)
+    day = Column(DateTime, nullable=False)
+    checksum = Column(String, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('location_id', 'day', name='unique_partition_location_day'),)
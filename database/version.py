@@ -0,0 +1,31 @@
+from datetime import datetime
+from .config import get_session
+from .models import DataVersion
+
+# Une seule ligne dans la table data_version
+VERSION_ROW_ID = 1
+
+def get_data_version():
+    # Lire la version courante des données (0 si rien n'a encore été chargé)
+    session = get_session()
+    try:
+        row = session.get(DataVersion, VERSION_ROW_ID)
+        return row.version if row else 0
+    except Exception:
+        # Table absente (ancienne base) : on considère la version 0
+        return 0
+    finally:
+        session.close()
+
+def bump_data_version(session):
+    # Incrémenter la version dans la transaction en cours
+    # (à appeler juste avant le commit du chargement)
+    row = session.get(DataVersion, VERSION_ROW_ID)
+    
+    if row is None:
+        row = DataVersion(id=VERSION_ROW_ID, version=0)
+        session.add(row)
+    
+    row.version = (row.version or 0) + 1
+    row.updated_at = datetime.utcnow()
+    return row.version
@@ -6,5 +6,6 @@ Permet l'import des modules ETL.
 from .extract import AirQualityExtractor
 from .transform import AirQualityTransformer
 from .load import AirQualityLoader
+from .aqi import AirQualityIndexCalculator
 
-__all__ = ['AirQualityExtractor', 'AirQualityTransformer', 'AirQualityLoader']
+__all__ = ['AirQualityExtractor', 'AirQualityTransformer', 'AirQualityLoader', 'AirQualityIndexCalculator']
@@ -0,0 +1,150 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from sqlalchemy import text
+from database.config import get_engine, to_sql_datetime
+from database.version import get_data_version
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_LAG_HOURS = 24      # Décalage maximal testé entre deux villes
+MIN_OVERLAP_HOURS = 24  # Heures communes nécessaires pour calculer une corrélation
+CACHE_SIZE = 32         # Résultats gardés en mémoire
+
+MEASUREMENTS_QUERY = """
+SELECT l.city, m.value, m.measurement_date
+FROM measurements m
+JOIN locations l ON m.location_id = l.id
+WHERE m.parameter = :parameter
+  AND (:start IS NULL OR m.measurement_date >= :start)
+  AND (:end IS NULL OR m.measurement_date <= :end)
+"""
+
+def city_hour_matrix(measurements_df):
+    # Matrice ville x heure (NaN pour les heures sans mesure)
+    # Entrée : colonnes city, value, measurement_date pour un seul polluant
+    city_codes, cities = pd.factorize(measurements_df['city'], sort=True)
+    hours = measurements_df['measurement_date'].dt.floor('h')
+    first_hour = hours.min()
+    positions = ((hours - first_hour) // pd.Timedelta(hours=1)).to_numpy()
+
+    matrix = np.full((len(cities), positions.max() + 1), np.nan)
+    matrix[city_codes, positions] = measurements_df['value'].to_numpy('float64')
+
+    index = pd.date_range(first_hour, periods=matrix.shape[1], freq='h')
+    return [str(city) for city in cities], index, matrix
+
+def _pairwise_correlation(a, b, min_overlap=MIN_OVERLAP_HOURS):
+    # Corrélation de Pearson entre chaque ligne de a et chaque ligne de b,
+    # sur les heures où les deux séries ont une valeur (six produits matriciels)
+    mask_a = ~np.isnan(a)
+    mask_b = ~np.isnan(b)
+    xa = np.where(mask_a, a, 0.0)
+    xb = np.where(mask_b, b, 0.0)
+    ma = mask_a.astype('float64')
+    mb = mask_b.astype('float64')
+
+    n = ma @ mb.T
+    sum_a = xa @ mb.T
+    sum_b = ma @ xb.T
+    sum_aa = (xa * xa) @ mb.T
+    sum_bb = ma @ (xb * xb).T
+    sum_ab = xa @ xb.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sum_ab - sum_a * sum_b
+        var = (n * sum_aa - sum_a ** 2) * (n * sum_bb - sum_b ** 2)
+        corr = cov / np.sqrt(var)
+
+    corr[(n < min_overlap) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+def correlation_matrix(matrix, min_overlap=MIN_OVERLAP_HOURS):
+    return _pairwise_correlation(matrix, matrix, min_overlap)
+
+def lagged_correlations(matrix, max_lag=MAX_LAG_HOURS, min_overlap=MIN_OVERLAP_HOURS):
+    # corr[k, i, j] = corrélation entre la ville i à l'heure t et la ville j à t + lag,
+    # pour lag = k - max_lag allant de -max_lag à +max_lag
+    hours = matrix.shape[1]
+    positive = []
+    for lag in range(min(max_lag, hours - 1) + 1):
+        positive.append(_pairwise_correlation(matrix[:, :hours - lag], matrix[:, lag:], min_overlap))
+    positive = np.stack(positive)
+
+    # Un décalage négatif de i vers j est le décalage positif de j vers i
+    negative = positive[:0:-1].transpose(0, 2, 1)
+    lags = np.arange(-(len(positive) - 1), len(positive))
+    return lags, np.concatenate([negative, positive])
+
+def best_lags(lags, correlations):
+    # Pour chaque couple : décalage qui maximise la corrélation, et cette corrélation
+    filled = np.where(np.isnan(correlations), -np.inf, correlations)
+    best = filled.argmax(axis=0)
+    peak = np.take_along_axis(correlations, best[np.newaxis], axis=0)[0]
+    best_lag = np.where(np.isnan(peak), np.nan, lags[best])
+    return best_lag, peak
+
+class CorrelationAnalyzer:
+    """Matrices de corrélation entre villes, mises en cache par version des données et période."""
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.engine = get_engine()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def analyze(self, parameter, start=None, end=None, max_lag=MAX_LAG_HOURS):
+        # Résultat : dict avec les villes et trois DataFrames ville x ville
+        # (corrélation, meilleur décalage en heures, corrélation à ce décalage)
+        # Un décalage positif en [i, j] signifie que la ville i précède la ville j
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        key = (get_data_version(), parameter, start, end, max_lag)
+
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        result = self._compute(parameter, start, end, max_lag)
+
+        with self._lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def _compute(self, parameter, start, end, max_lag):
+        params = {
+            'parameter': parameter,
+            'start': to_sql_datetime(start),
+            'end': to_sql_datetime(end),
+        }
+        with self.engine.connect() as conn:
+            df = pd.read_sql(text(MEASUREMENTS_QUERY), conn, params=params)
+
+        if df.empty:
+            return {'cities': [], 'correlation': pd.DataFrame(), 'best_lag': pd.DataFrame(), 'peak': pd.DataFrame()}
+
+        df['measurement_date'] = pd.to_datetime(df['measurement_date'], format='ISO8601')
+        cities, _, matrix = city_hour_matrix(df)
+
+        corr = correlation_matrix(matrix)
+        lags, lagged = lagged_correlations(matrix, max_lag)
+        best_lag, peak = best_lags(lags, lagged)
+
+        logger.info(f"Correlations {parameter}: {len(cities)} villes, {matrix.shape[1]} heures, decalages +/-{max_lag}h")
+        return {
+            'cities': cities,
+            'correlation': pd.DataFrame(corr, index=cities, columns=cities),
+            'best_lag': pd.DataFrame(best_lag, index=cities, columns=cities),
+            'peak': pd.DataFrame(peak, index=cities, columns=cities),
+        }
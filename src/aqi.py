@@ -0,0 +1,239 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from sqlalchemy import text, insert
+from database.config import get_engine, get_session, init_db, to_sql_datetime
+from database.models import Location, AirQualityIndex
+from database.version import bump_data_version
+from src.retention import raw_history_start
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seuils de l'indice européen (µg/m³) : bornes des niveaux 1 à 6
+# La dernière borne sert seulement à interpoler dans le niveau 6
+BREAKPOINTS = {
+    'pm25': [0, 10, 20, 25, 50, 75, 800],
+    'pm10': [0, 20, 40, 50, 100, 150, 1200],
+    'no2': [0, 40, 90, 120, 230, 340, 1000],
+    'o3': [0, 50, 100, 130, 240, 380, 800],
+    'so2': [0, 100, 200, 350, 500, 750, 1250],
+}
+POLLUTANTS = list(BREAKPOINTS)
+
+LEVELS = ['Bon', 'Moyen', 'Dégradé', 'Mauvais', 'Très mauvais', 'Extrêmement mauvais']
+
+# Chaque niveau couvre 20 points de l'indice continu
+POINTS_PER_LEVEL = 20
+
+# Les particules sont évaluées sur une moyenne glissante de 24h,
+# les gaz sur la valeur horaire
+ROLLING_POLLUTANTS = ['pm25', 'pm10']
+ROLLING_WINDOW = timedelta(hours=24)
+MIN_HOURS_24H = 18  # 75 % des heures de la fenêtre
+
+# Nombre de villes traitées à la fois lors d'un recalcul complet
+LOCATIONS_PER_CHUNK = 50
+
+def sub_index(values, breakpoints):
+    # Indice d'un polluant : niveau trouvé par recherche dichotomique dans les
+    # seuils, puis interpolation linéaire à l'intérieur du niveau
+    bounds = np.asarray(breakpoints, dtype='float64')
+    values = np.asarray(values, dtype='float64')
+
+    level = np.clip(np.searchsorted(bounds, values, side='right'), 1, len(bounds) - 1)
+    low = bounds[level - 1]
+    high = bounds[level]
+
+    index = (level - 1) * POINTS_PER_LEVEL + (np.minimum(values, high) - low) / (high - low) * POINTS_PER_LEVEL
+    return np.where(np.isnan(values), np.nan, index)
+
+def compute_aqi(measurements_df):
+    # Calculer l'indice par ville et par heure
+    # Entrée : colonnes location_id, parameter, value, measurement_date
+    columns = ['location_id', 'measurement_date', 'aqi', 'level', 'dominant']
+
+    # Code du polluant (-1 pour les paramètres hors indice, comme le CO)
+    param_codes = pd.Categorical(measurements_df['parameter'], categories=POLLUTANTS).codes
+    keep = param_codes >= 0
+    df = measurements_df[keep]
+    param_codes = param_codes[keep]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Une ligne par (ville, heure), une colonne par polluant
+    # Clé entière ville/date factorisée puis triée : évite un pivot pandas coûteux
+    # (la base ne contient qu'une valeur par ville, polluant et heure)
+    loc_codes, loc_values = pd.factorize(df['location_id'], sort=True)
+    seconds = df['measurement_date'].to_numpy('datetime64[s]').astype('int64')
+    origin = seconds.min()
+    span = seconds.max() - origin + 1
+    row_codes, keys = pd.factorize(loc_codes * span + (seconds - origin), sort=True)
+
+    values = np.full((len(keys), len(POLLUTANTS)), np.nan)
+    values[row_codes, param_codes] = df['value'].to_numpy('float64')
+
+    wide = pd.DataFrame(values, columns=POLLUTANTS)
+    wide.insert(0, 'location_id', np.asarray(loc_values)[keys // span])
+    wide.insert(1, 'measurement_date', (keys % span + origin).astype('datetime64[s]'))
+
+    # Moyenne glissante 24h des particules, ville par ville
+    # (wide est trié par ville puis par date : le résultat est dans le même ordre)
+    rolled = (
+        wide.groupby('location_id', sort=True)
+        .rolling(ROLLING_WINDOW, on='measurement_date', min_periods=MIN_HOURS_24H)[ROLLING_POLLUTANTS]
+        .mean()
+    )
+    wide[ROLLING_POLLUTANTS] = rolled[ROLLING_POLLUTANTS].to_numpy()
+
+    # Sous-indices (une colonne par polluant) puis maximum sur les polluants
+    sub_indices = np.column_stack([sub_index(wide[p].to_numpy(), BREAKPOINTS[p]) for p in POLLUTANTS])
+    valid = ~np.isnan(sub_indices).all(axis=1)
+    sub_indices = sub_indices[valid]
+
+    dominant = np.nanargmax(np.where(np.isnan(sub_indices), -np.inf, sub_indices), axis=1)
+    aqi = sub_indices[np.arange(len(sub_indices)), dominant]
+
+    result = wide.loc[valid, ['location_id', 'measurement_date']].reset_index(drop=True)
+    result['aqi'] = aqi.round(1)
+    result['level'] = np.minimum(aqi // POINTS_PER_LEVEL, len(LEVELS) - 1).astype('int64') + 1
+    result['dominant'] = np.asarray(POLLUTANTS)[dominant]
+    return result
+
+class AirQualityIndexCalculator:
+
+    def __init__(self):
+        init_db()
+        self.engine = get_engine()
+
+    def update_from_measurements(self, measurements_df):
+        # Recalculer uniquement les heures touchées par un chargement
+        if measurements_df.empty:
+            return 0
+
+        session = get_session()
+        try:
+            pairs = set(zip(measurements_df['city'], measurements_df['country']))
+            location_ids = [loc.id for loc in session.query(Location).all() if (loc.city, loc.country) in pairs]
+        finally:
+            session.close()
+
+        return self.update_range(
+            location_ids,
+            measurements_df['measurement_date'].min(),
+            measurements_df['measurement_date'].max()
+        )
+
+    def update_range(self, location_ids, start, end):
+        # Une mesure horaire entre start et end influence l'indice de start
+        # jusqu'à end + 23h (moyenne glissante des particules)
+        if not location_ids:
+            return 0
+
+        first_hour = pd.Timestamp(start)
+        last_hour = pd.Timestamp(end) + ROLLING_WINDOW - timedelta(hours=1)
+
+        floor = self._retention_floor()
+        if floor is not None:
+            first_hour = max(first_hour, floor)
+            if first_hour > last_hour:
+                return 0
+
+        # On relit aussi les 23h précédentes pour avoir des fenêtres complètes
+        measurements = self._read_measurements(location_ids, first_hour - ROLLING_WINDOW + timedelta(hours=1), last_hour)
+        result = compute_aqi(measurements)
+        result = result[(result['measurement_date'] >= first_hour) & (result['measurement_date'] <= last_hour)]
+
+        return self._store(result, location_ids, first_hour, last_hour)
+
+    def rebuild(self):
+        # Recalculer tout l'historique, par paquets de villes pour limiter la mémoire
+        # Après une rétention, seules les heures recalculables sont remplacées
+        session = get_session()
+        try:
+            location_ids = [row[0] for row in session.query(Location.id).order_by(Location.id).all()]
+        finally:
+            session.close()
+
+        floor = self._retention_floor()
+
+        total = 0
+        for i in range(0, len(location_ids), LOCATIONS_PER_CHUNK):
+            chunk = location_ids[i:i + LOCATIONS_PER_CHUNK]
+            result = compute_aqi(self._read_measurements(chunk))
+            if floor is not None:
+                result = result[result['measurement_date'] >= floor]
+            total += self._store(result, chunk, floor)
+
+        logger.info(f"Indice recalcule : {total} heures pour {len(location_ids)} villes")
+        return total
+
+    def _retention_floor(self):
+        # L'indice n'est recalculable qu'à partir de la première heure dont la fenêtre
+        # de 24h est entièrement conservée (None si aucune rétention n'a eu lieu)
+        start = raw_history_start(self.engine)
+        if start is None:
+            return None
+        return start + ROLLING_WINDOW - timedelta(hours=1)
+
+    def _read_measurements(self, location_ids, start=None, end=None):
+        ids = ','.join(str(int(i)) for i in location_ids)
+        query = f"""
+        SELECT location_id, parameter, value, measurement_date
+        FROM measurements
+        WHERE location_id IN ({ids})
+          AND parameter IN ({','.join(f"'{p}'" for p in POLLUTANTS)})
+        """
+        params = {}
+        if start is not None:
+            query += " AND measurement_date >= :start AND measurement_date <= :end"
+            params = {'start': to_sql_datetime(start), 'end': to_sql_datetime(end)}
+
+        with self.engine.connect() as conn:
+            df = pd.read_sql(text(query), conn, params=params)
+
+        df['measurement_date'] = pd.to_datetime(df['measurement_date'], format='ISO8601')
+        return df
+
+    def _store(self, result, location_ids, start=None, end=None):
+        # Remplacer les heures recalculées dans la table aqi
+        session = get_session()
+        try:
+            query = session.query(AirQualityIndex).filter(AirQualityIndex.location_id.in_(location_ids))
+            if start is not None:
+                query = query.filter(AirQualityIndex.measurement_date >= start.to_pydatetime())
+            if end is not None:
+                query = query.filter(AirQualityIndex.measurement_date <= end.to_pydatetime())
+            query.delete(synchronize_session=False)
+
+            if not result.empty:
+                records = [
+                    {
+                        'location_id': int(loc_id),
+                        'measurement_date': date.to_pydatetime(),
+                        'aqi': float(aqi),
+                        'level': int(level),
+                        'dominant': dominant
+                    }
+                    for loc_id, date, aqi, level, dominant in result.itertuples(index=False)
+                ]
+                session.execute(insert(AirQualityIndex), records)
+
+            # Le dashboard lit la table aqi : nouvelle version des données
+            bump_data_version(session)
+            session.commit()
+            return len(result)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Erreur lors de l'enregistrement de l'indice: {e}")
+            raise
+        finally:
+            session.close()
+
+if __name__ == "__main__":
+    AirQualityIndexCalculator().rebuild()
@@ -1,11 +1,23 @@
+import hashlib
 import logging
-from datetime import datetime
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
 from database.config import get_session, init_db
-from database.models import Location, Measurement
+from database.models import Location, Measurement, PartitionChecksum, DailyMeasurement, AQI_PARAMETER
+from database.version import bump_data_version
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def partition_checksum(rows):
+    # Empreinte d'une partition : rows est un dict {(parametre, date): (valeur, unite)}
+    # Les lignes sont triées pour que l'empreinte ne dépende pas de l'ordre de lecture
+    digest = hashlib.sha1()
+    for (parameter, date), (value, unit) in sorted(rows.items()):
+        digest.update(f"{parameter}|{date:%Y-%m-%d %H:%M:%S}|{float(value)!r}|{unit}\n".encode('utf-8'))
+    return digest.hexdigest()
+
 class AirQualityLoader:
     
     def __init__(self):
@@ -19,7 +31,7 @@ class AirQualityLoader:
         try:
             if locations_df.empty and measurements_df.empty:
                 logger.warning("Aucune donnee a charger")
-                return
+                return {'new': 0, 'updated': 0, 'unchanged': 0, 'archived': 0}
 
             # Étape 1 : Charger les villes
             logger.info(f"Chargement de {len(locations_df)} locations...")
@@ -51,38 +63,121 @@ class AirQualityLoader:
                 
                 location_map[(city, country)] = loc.id
             
-            # Étape 2 : Charger les mesures
+            # Étape 2 : Charger les mesures, partition par partition (ville, jour)
+            # Open-Meteo révise les dernières heures : une journée déjà chargée est
+            # réécrite si son contenu a changé, ignorée sinon
             logger.info(f"Chargement de {len(measurements_df)} mesures...")
             
-            new_count = 0
-            for _, row in measurements_df.iterrows():
-                loc_key = (row['city'], row['country'])
+            df = measurements_df.assign(
+                location_id=[location_map.get(key) for key in zip(measurements_df['city'], measurements_df['country'])],
+                day=pd.to_datetime(measurements_df['measurement_date']).dt.normalize()
+            )
+            df = df[df['location_id'].notna()]
+            
+            # Empreintes déjà connues pour les partitions reçues
+            stored = {
+                (p.location_id, p.day): p
+                for p in session.query(PartitionChecksum).filter(
+                    PartitionChecksum.location_id.in_([int(i) for i in df['location_id'].unique()]),
+                    PartitionChecksum.day >= df['day'].min().to_pydatetime(),
+                    PartitionChecksum.day <= df['day'].max().to_pydatetime()
+                ).all()
+            } if not df.empty else {}
+            
+            # Journées déjà agrégées par la rétention : leurs mesures horaires ont été
+            # supprimées, les recharger les compterait deux fois avec measurements_daily
+            archived = {
+                (location_id, day)
+                for location_id, day in session.query(DailyMeasurement.location_id, DailyMeasurement.day).filter(
+                    DailyMeasurement.location_id.in_([int(i) for i in df['location_id'].unique()]),
+                    DailyMeasurement.day >= df['day'].min().to_pydatetime(),
+                    DailyMeasurement.day <= df['day'].max().to_pydatetime()
+                ).distinct()
+            } if not df.empty else set()
+            
+            stats = {'new': 0, 'updated': 0, 'unchanged': 0, 'archived': 0}
+            new_rows = 0
+            
+            for (loc_id, day), part in df.groupby(['location_id', 'day']):
+                loc_id = int(loc_id)
+                day = day.to_pydatetime()
                 
-                if loc_key in location_map:
-                    loc_id = location_map[loc_key]
-                    
-                    # Vérifier si la mesure existe déjà (même lieu, paramètre, date)
-                    exists = session.query(Measurement).filter_by(
-                        location_id=loc_id,
-                        parameter=row['parameter'],
-                        measurement_date=row['measurement_date']
-                    ).first()
+                if (loc_id, day) in archived:
+                    stats['archived'] += 1
+                    continue
+                
+                incoming = {
+                    (parameter, date.to_pydatetime()): (value, unit)
+                    for parameter, date, value, unit in zip(
+                        part['parameter'], part['measurement_date'], part['value'], part['unit']
+                    )
+                }
+                partition = stored.get((loc_id, day))
+                
+                # Cas courant : même contenu que la dernière fois, rien à lire ni écrire
+                if partition is not None and partition.checksum == partition_checksum(incoming):
+                    stats['unchanged'] += 1
+                    continue
+                
+                # Sinon on compare avec les lignes en base (le lot peut ne couvrir
+                # qu'une partie de la journée, ou la partition n'a pas encore d'empreinte)
+                existing = {
+                    (m.parameter, m.measurement_date): (m.value, m.unit)
+                    for m in session.query(Measurement).filter(
+                        Measurement.location_id == loc_id,
+                        Measurement.measurement_date >= day,
+                        Measurement.measurement_date < day + timedelta(days=1)
+                    ).all()
+                }
+                merged = {**existing, **incoming}
+                
+                if merged == existing:
+                    stats['unchanged'] += 1
+                else:
+                    if existing:
+                        stats['updated'] += 1
+                        session.query(Measurement).filter(
+                            Measurement.location_id == loc_id,
+                            Measurement.measurement_date >= day,
+                            Measurement.measurement_date < day + timedelta(days=1)
+                        ).delete(synchronize_session=False)
+                    else:
+                        stats['new'] += 1
                     
-                    if not exists:
-                        # Ajouter la nouvelle mesure
-                        measure = Measurement(
-                            location_id=loc_id,
-                            parameter=row['parameter'],
-                            value=row['value'],
-                            unit=row['unit'],
-                            measurement_date=row['measurement_date']
-                        )
-                        session.add(measure)
-                        new_count += 1
+                    session.execute(insert(Measurement), [
+                        {
+                            'location_id': loc_id,
+                            'parameter': parameter,
+                            'value': value,
+                            'unit': unit,
+                            'measurement_date': date
+                        }
+                        for (parameter, date), (value, unit) in merged.items()
+                    ])
+                    new_rows += len(merged.keys() - existing.keys())
+                
+                # Enregistrer l'empreinte de la partition telle qu'elle est en base
+                if partition is None:
+                    partition = PartitionChecksum(location_id=loc_id, day=day)
+                    session.add(partition)
+                partition.checksum = partition_checksum(merged)
+                partition.row_count = len(merged)
+                partition.updated_at = datetime.utcnow()
+            
+            # Nouvelle version des données : invalide les caches du dashboard
+            if stats['new'] or stats['updated']:
+                bump_data_version(session)
             
             # Sauvegarder tout d'un coup
             session.commit()
-            logger.info(f"Succes : {new_count} nouvelles mesures ajoutees")
+            logger.info(f"Succes : {new_rows} nouvelles mesures ajoutees")
+            logger.info(
+                f"Partitions (ville, jour) : {stats['new']} nouvelles, "
+                f"{stats['updated']} mises a jour, {stats['unchanged']} inchangees, "
+                f"{stats['archived']} deja agregees (ignorees)"
+            )
+            
+            return stats
             
         except Exception as e:
             session.rollback()
@@ -97,11 +192,16 @@ class AirQualityLoader:
         try:
             loc_count = session.query(Location).count()
             mes_count = session.query(Measurement).count()
+            # Mesures anciennes agrégées par jour par la rétention
+            aggregated_count = session.query(func.coalesce(func.sum(DailyMeasurement.count), 0)).filter(
+                DailyMeasurement.parameter != AQI_PARAMETER
+            ).scalar()
             last_mes = session.query(Measurement).order_by(Measurement.measurement_date.desc()).first()
             
             return {
                 'locations': loc_count,
                 'measurements': mes_count,
+                'aggregated_measurements': aggregated_count,
                 'last_measurement': last_mes.measurement_date if last_mes else None
             }
         finally:
@@ -7,6 +7,7 @@ from datetime import datetime
 from extract import AirQualityExtractor
 from transform import AirQualityTransformer
 from load import AirQualityLoader
+from aqi import AirQualityIndexCalculator
 
 # Configuration des logs
 logging.basicConfig(
@@ -25,6 +26,7 @@ class ETLPipeline:
         self.extractor = AirQualityExtractor()
         self.transformer = AirQualityTransformer()
         self.loader = AirQualityLoader()
+        self.aqi_calculator = AirQualityIndexCalculator()
     
     def run(self, countries=['FR', 'DE', 'ES', 'IT', 'BE'], limit=100):
         # Lancer le pipeline complet : Extract → Transform → Load
@@ -63,10 +65,15 @@ class ETLPipeline:
             
             # ETAPE 3 : Chargement
             logger.info("\n[3/3] CHARGEMENT dans SQLite...")
-            self.loader.load_data(locations_df, measurements_df)
+            load_stats = self.loader.load_data(locations_df, measurements_df)
             
             logger.info("Chargement reussi")
             
+            # Indice européen : seules les heures touchées par ce chargement sont recalculées
+            if load_stats['new'] or load_stats['updated']:
+                aqi_count = self.aqi_calculator.update_from_measurements(measurements_df)
+                logger.info(f"Indice europeen mis a jour: {aqi_count} heures")
+            
             # Stats finales de la base
             db_stats = self.loader.get_stats()
             logger.info("\n" + "=" * 60)
@@ -76,6 +83,7 @@ class ETLPipeline:
             logger.info(f"\nStatistiques de la base de donnees:")
             logger.info(f"  - Total localisations: {db_stats['locations']}")
             logger.info(f"  - Total mesures: {db_stats['measurements']}")
+            logger.info(f"  - Mesures agregees par jour: {db_stats['aggregated_measurements']}")
             logger.info(f"  - Derniere mesure: {db_stats['last_measurement']}")
             logger.info("=" * 60)
             
@@ -0,0 +1,245 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+import time
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert
+from database.config import get_engine, get_session, init_db
+from database.models import Measurement, AirQualityIndex, DailyMeasurement, PartitionChecksum, AQI_PARAMETER
+from database.version import bump_data_version
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Valeurs par défaut du job de rétention
+RAW_RETENTION_DAYS = 90     # Jours de mesures horaires conservées
+BATCH_SIZE = 5000           # Mesures traitées par transaction
+PAUSE_SECONDS = 0.1         # Pause entre deux transactions
+VACUUM_PAGES = 2000         # Pages libérées par le vacuum incrémental (0 = toutes)
+
+def raw_history_start(engine):
+    # Première journée dont les mesures horaires sont conservées : les journées
+    # antérieures ont été agrégées puis supprimées (None si aucune rétention n'a eu lieu)
+    with engine.connect() as conn:
+        last_day = conn.exec_driver_sql("SELECT MAX(day) FROM measurements_daily").scalar()
+    if last_day is None:
+        return None
+    return pd.Timestamp(last_day) + timedelta(days=1)
+
+class RetentionJob:
+
+    def __init__(self, raw_days=RAW_RETENTION_DAYS, batch_size=BATCH_SIZE,
+                 pause=PAUSE_SECONDS, vacuum_pages=VACUUM_PAGES):
+        init_db()
+        self.raw_days = raw_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+
+    def run(self, now=None):
+        # Agréger par jour puis supprimer les mesures horaires plus vieilles que raw_days
+        # (mesures et indice de qualité de l'air)
+        # On ne traite que des journées complètes : la limite est ramenée à minuit
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.raw_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        logger.info(f"Retention: agregation des mesures anterieures au {cutoff:%Y-%m-%d}")
+
+        batches = 0
+        deleted = {Measurement: 0, AirQualityIndex: 0}
+        for model in deleted:
+            while True:
+                count = self._process_batch(model, cutoff)
+                if count == 0:
+                    break
+
+                batches += 1
+                deleted[model] += count
+
+                # Laisser passer les autres écritures (pipeline) entre deux lots
+                if self.pause:
+                    time.sleep(self.pause)
+
+        if any(deleted.values()):
+            self._bump_version()
+
+        self._incremental_vacuum()
+
+        logger.info(
+            f"Retention terminee: {deleted[Measurement]} mesures et {deleted[AirQualityIndex]} "
+            f"indices horaires agreges et supprimes en {batches} lots"
+        )
+        return {
+            'cutoff': cutoff,
+            'batches': batches,
+            'deleted': deleted[Measurement],
+            'aqi_deleted': deleted[AirQualityIndex]
+        }
+
+    def _read_batch(self, session, model, cutoff):
+        # Lignes horaires les plus anciennes (ordre des id), au format de measurements
+        if model is Measurement:
+            rows = (
+                session.query(
+                    Measurement.id,
+                    Measurement.location_id,
+                    Measurement.parameter,
+                    Measurement.unit,
+                    Measurement.value,
+                    Measurement.measurement_date
+                )
+                .filter(Measurement.measurement_date < cutoff)
+                .order_by(Measurement.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            return pd.DataFrame(rows, columns=['id', 'location_id', 'parameter', 'unit', 'value', 'measurement_date'])
+
+        # L'indice est agrégé comme un paramètre de plus, sans unité
+        rows = (
+            session.query(
+                AirQualityIndex.id,
+                AirQualityIndex.location_id,
+                AirQualityIndex.aqi,
+                AirQualityIndex.measurement_date
+            )
+            .filter(AirQualityIndex.measurement_date < cutoff)
+            .order_by(AirQualityIndex.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        df = pd.DataFrame(rows, columns=['id', 'location_id', 'value', 'measurement_date'])
+        df.insert(2, 'parameter', AQI_PARAMETER)
+        df.insert(3, 'unit', None)
+        return df
+
+    def _process_batch(self, model, cutoff):
+        # Un lot = une transaction courte : agrégation + suppression des mêmes lignes
+        session = get_session()
+        try:
+            df = self._read_batch(session, model, cutoff)
+
+            if df.empty:
+                return 0
+
+            df['day'] = pd.to_datetime(df['measurement_date']).dt.normalize()
+
+            daily = df.groupby(['location_id', 'parameter', 'day'], as_index=False).agg(
+                unit=('unit', 'first'),
+                mean_value=('value', 'mean'),
+                min_value=('value', 'min'),
+                max_value=('value', 'max'),
+                count=('value', 'size')
+            )
+
+            records = [
+                {
+                    'location_id': int(row.location_id),
+                    'parameter': row.parameter,
+                    'unit': row.unit,
+                    'day': row.day.to_pydatetime(),
+                    'mean_value': float(row.mean_value),
+                    'min_value': float(row.min_value),
+                    'max_value': float(row.max_value),
+                    'count': int(row.count)
+                }
+                for row in daily.itertuples(index=False)
+            ]
+
+            # Une même journée peut être répartie sur plusieurs lots :
+            # on fusionne avec l'agrégat déjà enregistré
+            stmt = insert(DailyMeasurement)
+            existing = DailyMeasurement.__table__.c
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['location_id', 'parameter', 'day'],
+                set_={
+                    'mean_value': (existing.mean_value * existing.count + stmt.excluded.mean_value * stmt.excluded.count)
+                                  / (existing.count + stmt.excluded.count),
+                    # min()/max() à deux arguments sont des fonctions scalaires en SQLite
+                    'min_value': func.min(existing.min_value, stmt.excluded.min_value),
+                    'max_value': func.max(existing.max_value, stmt.excluded.max_value),
+                    'count': existing.count + stmt.excluded.count
+                }
+            )
+            session.execute(stmt, records)
+
+            # Les lignes du lot sont exactement celles d'id <= dernier id lu
+            # (lues dans l'ordre des id) : pas besoin d'une longue liste IN (...)
+            last_id = int(df['id'].max())
+            session.execute(
+                delete(model)
+                .where(model.id <= last_id)
+                .where(model.measurement_date < cutoff)
+            )
+
+            # Les empreintes des journées agrégées ne servent plus : le chargement
+            # ignore désormais ces journées (voir measurements_daily)
+            for location_id, days in daily.groupby('location_id')['day']:
+                session.execute(
+                    delete(PartitionChecksum)
+                    .where(PartitionChecksum.location_id == int(location_id))
+                    .where(PartitionChecksum.day.in_([day.to_pydatetime() for day in days.unique()]))
+                )
+
+            session.commit()
+            return len(df)
+
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Erreur pendant la retention: {e}")
+            raise
+        finally:
+            session.close()
+
+    def _bump_version(self):
+        session = get_session()
+        try:
+            bump_data_version(session)
+            session.commit()
+        finally:
+            session.close()
+
+    def _incremental_vacuum(self):
+        # Rendre au système les pages libérées, sans VACUUM complet bloquant
+        engine = get_engine()
+        with engine.connect() as conn:
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode != 2:
+                logger.warning("Vacuum incremental indisponible (base creee avant son activation) : "
+                               "lancer un VACUUM complet une fois, hors des heures d'utilisation")
+                return
+
+            freelist_before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+            # Le pragma libère une page par étape : il faut parcourir tout son résultat,
+            # ce que seul le curseur sqlite3 permet (SQLAlchemy n'y voit aucune ligne)
+            pages = f"({int(self.vacuum_pages)})" if self.vacuum_pages else ""
+            cursor = conn.connection.driver_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA incremental_vacuum{pages}")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+
+            freelist_after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            logger.info(f"Vacuum incremental: {freelist_before - freelist_after} pages liberees")
+
+def main():
+    parser = argparse.ArgumentParser(description="Retention et agregation journaliere des mesures")
+    parser.add_argument('--days', type=int, default=RAW_RETENTION_DAYS, help="jours de mesures horaires conserves")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="mesures par transaction")
+    parser.add_argument('--pause', type=float, default=PAUSE_SECONDS, help="pause entre deux lots (secondes)")
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES, help="pages liberees (0 = toutes)")
+    args = parser.parse_args()
+
+    job = RetentionJob(raw_days=args.days, batch_size=args.batch_size,
+                       pause=args.pause, vacuum_pages=args.vacuum_pages)
+    job.run()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,9 +1,45 @@
+import argparse
+import json
+import os
 import pandas as pd
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Colonnes texte répétées sur chaque mesure : stockées en category
+CATEGORY_COLUMNS = ['city', 'country', 'parameter', 'unit']
+
+def compact_measurements(df):
+    # Schéma compact des frames gardés en mémoire (dashboard) :
+    # category pour les textes répétés, float32 pour les valeurs
+    # Le chargement en base garde les valeurs float64 d'origine
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'value' in df.columns:
+        df['value'] = df['value'].astype('float32')
+    return df
+
+def memory_report(wide_df):
+    # Comparer la mémoire de l'ancien format (une ligne = textes + coordonnées)
+    # avec le format compact (mesures compactes + coordonnées une fois par ville)
+    measurement_cols = [c for c in wide_df.columns if c not in ('latitude', 'longitude')]
+    compact_df = compact_measurements(wide_df[measurement_cols])
+    locations_df = wide_df[['city', 'country', 'latitude', 'longitude']].drop_duplicates()
+    
+    legacy_bytes = int(wide_df.memory_usage(deep=True).sum())
+    compact_bytes = int(compact_df.memory_usage(deep=True).sum() + locations_df.memory_usage(deep=True).sum())
+    
+    report = pd.DataFrame({
+        'layout': ['legacy', 'compact'],
+        'rows': [len(wide_df), len(compact_df)],
+        'bytes': [legacy_bytes, compact_bytes],
+    })
+    report['ratio'] = (report['bytes'] / legacy_bytes).round(3) if legacy_bytes else 0.0
+    return report
+
 class AirQualityTransformer:
     
     def transform(self, raw_data):
@@ -30,8 +66,12 @@ class AirQualityTransformer:
         # Table des villes (sans doublon)
         locations_df = df[['city', 'country', 'latitude', 'longitude']].drop_duplicates()
         
-        # Table des mesures
-        measurements_df = df[['city', 'country', 'parameter', 'value', 'unit', 'measurement_date']].copy()
+        # Table des mesures (les coordonnées restent dans locations_df)
+        # Textes répétés en category ; valeurs laissées en float64 (et non float32 comme
+        # dans compact_measurements) : elles sont écrites telles quelles en base
+        measurements_df = df[['city', 'country', 'parameter', 'value', 'unit', 'measurement_date']].astype(
+            {col: 'category' for col in CATEGORY_COLUMNS}
+        )
         
         logger.info(f"Transformation terminee: {len(locations_df)} villes, {len(measurements_df)} mesures")
         
@@ -42,8 +82,31 @@ class AirQualityTransformer:
         if measurements_df.empty:
             return pd.DataFrame()
         
-        stats = measurements_df.groupby(['city', 'parameter']).agg({
+        stats = measurements_df.groupby(['city', 'parameter'], observed=True).agg({
             'value': ['mean', 'min', 'max', 'count']
         }).round(2)
         
         return stats
+
+def main():
+    # Rapport mémoire des deux formats sur un fichier de mesures (données de démo par défaut)
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Compare la memoire du format historique et du format compact")
+    parser.add_argument('--file', default=os.path.join(root_dir, 'demo_data.json'),
+                        help="fichier JSON avec les cles 'locations' et 'measurements'")
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as f:
+        data = json.load(f)
+
+    wide_df = pd.DataFrame(data['measurements']).merge(
+        pd.DataFrame(data['locations'])[['city', 'country', 'latitude', 'longitude']],
+        on=['city', 'country']
+    )
+    wide_df['measurement_date'] = pd.to_datetime(wide_df['measurement_date'], format='ISO8601')
+
+    print(memory_report(wide_df[['city', 'country', 'latitude', 'longitude', 'parameter', 'value', 'unit', 'measurement_date']]).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
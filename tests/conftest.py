@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytest
+from database import config
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # Chaque test travaille sur sa propre base SQLite
+    path = str(tmp_path / 'air_quality.db')
+    monkeypatch.setattr(config, 'get_db_path', lambda: path)
+    return path
+
+
+def make_locations(cities=('Paris',)):
+    return pd.DataFrame({
+        'city': list(cities),
+        'country': 'FR',
+        'latitude': 48.9,
+        'longitude': 2.4,
+    })
+
+
+def make_measurements(values, start='2025-01-01', city='Paris', parameter='pm25'):
+    # Mesures horaires consécutives à partir de start
+    return pd.DataFrame({
+        'city': city,
+        'country': 'FR',
+        'parameter': parameter,
+        'value': [float(v) for v in values],
+        'unit': 'µg/m³',
+        'measurement_date': pd.date_range(start, periods=len(values), freq='h'),
+    })
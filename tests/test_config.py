@@ -0,0 +1,72 @@
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from database.config import init_db, get_session, to_sql_datetime
+from database.models import Measurement
+
+# Table measurements telle que créée avant AUTOINCREMENT
+BASELINE_DDL = """
+CREATE TABLE measurements (
+    id INTEGER NOT NULL,
+    location_id INTEGER NOT NULL,
+    parameter VARCHAR NOT NULL,
+    value FLOAT NOT NULL,
+    unit VARCHAR,
+    measurement_date DATETIME NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (id)
+)
+"""
+
+
+def table_sql(conn, name):
+    return conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()[0]
+
+
+def test_baseline_table_is_migrated_to_autoincrement(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(BASELINE_DDL)
+        conn.executemany(
+            "INSERT INTO measurements (id, location_id, parameter, value, unit, measurement_date) VALUES (?, 1, 'pm25', ?, 'µg/m³', ?)",
+            [(i, float(i), f'2025-01-01 {i:02d}:00:00.000000') for i in range(1, 6)]
+        )
+        conn.execute("DELETE FROM measurements WHERE id = 3")
+    with sqlite3.connect(db_path) as conn:
+        rows_before = conn.execute("SELECT * FROM measurements ORDER BY id").fetchall()
+
+    init_db()
+
+    with sqlite3.connect(db_path) as conn:
+        assert 'AUTOINCREMENT' in table_sql(conn, 'measurements')
+        assert table_sql(conn, 'ix_measurements_location_parameter_date') is not None
+        assert conn.execute("SELECT * FROM measurements ORDER BY id").fetchall() == rows_before
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'measurements_old'").fetchone() is None
+
+        # Le plus grand id supprimé n'est pas redonné
+        conn.execute("DELETE FROM measurements WHERE id = 5")
+        conn.execute(
+            "INSERT INTO measurements (location_id, parameter, value, unit, measurement_date) "
+            "VALUES (1, 'pm25', 1.0, 'µg/m³', '2025-01-02 00:00:00.000000')"
+        )
+        assert conn.execute("SELECT MAX(id) FROM measurements").fetchone()[0] == 6
+
+    # Seconde initialisation : rien à migrer, les données restent en place
+    init_db()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0] == 4
+
+
+def test_to_sql_datetime_matches_the_stored_format(db_path):
+    init_db()
+    date = datetime(2025, 1, 2, 3, 0)
+    session = get_session()
+    try:
+        session.add(Measurement(location_id=1, parameter='pm25', value=1.0, unit='µg/m³', measurement_date=date))
+        session.commit()
+    finally:
+        session.close()
+
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute("SELECT measurement_date FROM measurements").fetchone()[0]
+    assert to_sql_datetime(date) == to_sql_datetime(pd.Timestamp(date)) == stored
+    assert to_sql_datetime(None) is None
@@ -0,0 +1,85 @@
+import sqlite3
+from database.version import get_data_version
+from database.config import get_engine
+from dashboard.frame_cache import MeasurementFrame
+from src.load import AirQualityLoader
+from conftest import make_locations, make_measurements
+
+
+def read_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT id, measurement_date, value FROM measurements ORDER BY measurement_date"
+        ).fetchall()
+
+
+def test_unchanged_partition_is_skipped(db_path):
+    loader = AirQualityLoader()
+    measurements = make_measurements([10.0] * 24)
+
+    assert loader.load_data(make_locations(), measurements)['new'] == 1
+    before = read_rows(db_path)
+    version = get_data_version()
+
+    stats = loader.load_data(make_locations(), measurements)
+
+    assert stats == {'new': 0, 'updated': 0, 'unchanged': 1, 'archived': 0}
+    assert read_rows(db_path) == before
+    assert get_data_version() == version
+
+
+def test_partial_day_batch_is_merged(db_path):
+    loader = AirQualityLoader()
+    loader.load_data(make_locations(), make_measurements([10.0] * 12))
+
+    stats = loader.load_data(make_locations(), make_measurements([20.0] * 12, start='2025-01-01 12:00'))
+
+    assert stats['updated'] == 1
+    values = [value for _, _, value in read_rows(db_path)]
+    assert values == [10.0] * 12 + [20.0] * 12
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT row_count FROM partition_checksums").fetchall() == [(24,)]
+
+    # Le lot complet de la journée a maintenant la même empreinte que la base
+    full_day = make_measurements([10.0] * 12 + [20.0] * 12)
+    assert loader.load_data(make_locations(), full_day)['unchanged'] == 1
+
+
+def test_revised_value_rewrites_only_its_partition(db_path):
+    loader = AirQualityLoader()
+    loader.load_data(make_locations(), make_measurements([10.0] * 48))
+    before = read_rows(db_path)
+
+    revised = make_measurements([10.0] * 47 + [42.0])
+    stats = loader.load_data(make_locations(), revised)
+
+    assert stats == {'new': 0, 'updated': 1, 'unchanged': 1, 'archived': 0}
+    after = read_rows(db_path)
+    assert after[-1][2] == 42.0
+    # Le premier jour n'est pas réécrit
+    assert after[:24] == before[:24]
+
+
+def test_rewrite_never_reuses_ids(db_path):
+    loader = AirQualityLoader()
+    loader.load_data(make_locations(), make_measurements([10.0] * 20))
+    max_id = max(row[0] for row in read_rows(db_path))
+
+    loader.load_data(make_locations(), make_measurements([10.0] * 19 + [42.0]))
+
+    assert min(row[0] for row in read_rows(db_path)) > max_id
+
+
+def test_frame_picks_up_revisions(db_path):
+    loader = AirQualityLoader()
+    loader.load_data(make_locations(), make_measurements([10.0] * 20))
+    frame = MeasurementFrame(get_engine())
+    frame.refresh(get_data_version())
+
+    loader.load_data(make_locations(), make_measurements([10.0] * 19 + [42.0]))
+    df = frame.refresh(get_data_version())
+
+    assert len(df) == 20
+    assert df['value'].iloc[-1] == 42.0
+    assert df['value'].sum() == 19 * 10.0 + 42.0
@@ -0,0 +1,92 @@
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from database.config import get_engine
+from database.version import get_data_version
+from dashboard.frame_cache import MeasurementFrame
+from src.load import AirQualityLoader
+from src.retention import RetentionJob
+from conftest import make_locations, make_measurements
+
+
+def load_history(days=10):
+    # Deux villes, deux polluants, valeurs variées heure par heure
+    rng = np.random.default_rng(0)
+    measurements = pd.concat([
+        make_measurements(rng.gamma(2.0, 10.0, size=24 * days).round(1), city=city, parameter=parameter)
+        for city in ('Paris', 'Lyon')
+        for parameter in ('pm25', 'no2')
+    ], ignore_index=True)
+    AirQualityLoader().load_data(make_locations(('Paris', 'Lyon')), measurements)
+    return measurements
+
+
+def test_running_frame_drops_rows_deleted_by_retention(db_path):
+    AirQualityLoader().load_data(make_locations(), make_measurements(range(24 * 10)))
+    frame = MeasurementFrame(get_engine())
+    assert len(frame.refresh(get_data_version())) == 24 * 10
+
+    RetentionJob(raw_days=3, pause=0).run(now=datetime(2025, 1, 11))
+    df = frame.refresh(get_data_version())
+
+    with sqlite3.connect(db_path) as conn:
+        raw_count = conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+    fresh = MeasurementFrame(get_engine()).refresh(get_data_version())
+    assert len(df) == len(fresh) == raw_count == 24 * 3
+    assert df['measurement_date'].iloc[0] == datetime(2025, 1, 8)
+
+
+def test_batches_split_across_a_day_match_a_direct_groupby(db_path):
+    measurements = load_history()
+    cutoff = datetime(2025, 1, 6)
+
+    # 7 lignes par lot : chaque journée est répartie sur plusieurs lots
+    stats = RetentionJob(raw_days=5, batch_size=7, pause=0).run(now=datetime(2025, 1, 11))
+    assert stats['deleted'] == 4 * 24 * 5
+    assert stats['batches'] > stats['deleted'] / 24
+
+    old = measurements[measurements['measurement_date'] < cutoff]
+    expected = old.assign(day=old['measurement_date'].dt.normalize()).groupby(
+        ['city', 'parameter', 'day'], as_index=False
+    ).agg(mean_value=('value', 'mean'), min_value=('value', 'min'),
+          max_value=('value', 'max'), count=('value', 'size'))
+
+    with sqlite3.connect(db_path) as conn:
+        daily = pd.read_sql(
+            """
+            SELECT l.city, d.parameter, d.day, d.mean_value, d.min_value, d.max_value, d.count
+            FROM measurements_daily d JOIN locations l ON d.location_id = l.id
+            WHERE d.parameter != 'aqi'
+            """,
+            conn
+        )
+        assert conn.execute(
+            "SELECT COUNT(*) FROM measurements WHERE measurement_date < '2025-01-06'"
+        ).fetchone()[0] == 0
+        assert conn.execute(
+            "SELECT COUNT(*) FROM partition_checksums WHERE day < '2025-01-06'"
+        ).fetchone()[0] == 0
+
+    daily['day'] = pd.to_datetime(daily['day'], format='ISO8601')
+    merged = expected.merge(daily, on=['city', 'parameter', 'day'], suffixes=('', '_db'))
+    assert len(merged) == len(expected) == 2 * 2 * 5
+    assert (merged['count'] == merged['count_db']).all()
+    for column in ('mean_value', 'min_value', 'max_value'):
+        assert np.allclose(merged[column], merged[f'{column}_db'])
+
+
+def test_reloading_archived_days_is_skipped(db_path):
+    measurements = load_history()
+    RetentionJob(raw_days=5, batch_size=50, pause=0).run(now=datetime(2025, 1, 11))
+
+    with sqlite3.connect(db_path) as conn:
+        before = conn.execute("SELECT COUNT(*), SUM(count) FROM measurements_daily").fetchone()
+        raw_before = conn.execute("SELECT COUNT(*) FROM measurements").fetchone()
+
+    stats = AirQualityLoader().load_data(make_locations(('Paris', 'Lyon')), measurements)
+
+    assert stats == {'new': 0, 'updated': 0, 'unchanged': 2 * 5, 'archived': 2 * 5}
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*), SUM(count) FROM measurements_daily").fetchone() == before
+        assert conn.execute("SELECT COUNT(*) FROM measurements").fetchone() == raw_before